@@ -0,0 +1,808 @@
+"""
+Kava Core
+Shared RPC client and date -> block search used by the KAVA and WKAVA balance checkers.
+"""
+
+import os
+import re
+import base64
+import calendar
+import json
+import gzip
+import zlib
+import http.client
+import urllib.parse
+import urllib.request
+import ssl
+import time
+import sqlite3
+from collections import OrderedDict
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+try:
+    # Optional C JSON codec; the stdlib json module is used when it is not installed
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Default directory for the on-disk date -> last block index
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "kava_balance_checker")
+
+# KAVA and WKAVA both have 18 decimal places
+WEI_PER_TOKEN = 10 ** 18
+
+_DATE_RE = re.compile(r"([0-9]{4})-([0-9]{2})-([0-9]{2})")
+
+
+def _json_dumps(payload) -> bytes:
+    """Encode a JSON-RPC payload, with orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload).encode('utf-8')
+
+
+def _json_loads(body: bytes):
+    """Decode a JSON-RPC response body, with orjson when available.
+    
+    orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch
+    decode errors the same way with either codec.
+    """
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body.decode('utf-8'))
+
+
+def int_to_hex(value: int) -> str:
+    """Format an integer as a 0x-prefixed hex quantity for RPC params."""
+    return hex(value)
+
+
+def hex_to_int(value: str) -> int:
+    """Parse a 0x-prefixed hex quantity from an RPC response ("0x" is treated as 0)."""
+    if value == "0x":
+        return 0
+    return int(value, 16)
+
+
+class RPCError(Exception):
+    """Error object returned by the node for a JSON-RPC call."""
+    
+    # JSON-RPC error code for a method the node does not implement
+    METHOD_NOT_FOUND = -32601
+    
+    def __init__(self, error):
+        super().__init__(f"RPC error: {error}")
+        self.code = error.get("code") if isinstance(error, dict) else None
+
+
+class _ResumingHTTPSConnection(http.client.HTTPSConnection):
+    """HTTPS connection that resumes the previous TLS session when it reconnects."""
+    
+    def __init__(self, host: str, port: Optional[int], timeout: float, context: ssl.SSLContext):
+        super().__init__(host, port, timeout=timeout, context=context)
+        self._ssl_ctx = context
+        self._tls_session = None
+    
+    def connect(self):
+        """Open the TCP connection and wrap it in TLS, offering the saved session."""
+        http.client.HTTPConnection.connect(self)
+        server_hostname = self._tunnel_host or self.host
+        self.sock = self._ssl_ctx.wrap_socket(self.sock, server_hostname=server_hostname, session=self._tls_session)
+    
+    def close(self):
+        """Close the connection, keeping its TLS session for the next connect."""
+        session = getattr(self.sock, "session", None)
+        if session is not None:
+            self._tls_session = session
+        super().close()
+
+
+class KavaRPCClient:
+    """RPC client for interacting with Kava blockchain archival node."""
+    
+    # The latest block is reused for this many seconds, shorter than Kava's block time
+    LATEST_BLOCK_TTL = 2.0
+    
+    # Most calls sent in one HTTP request; geth rejects batches of over 1000 calls
+    # by default and hosted endpoints often allow only a few hundred
+    MAX_BATCH_SIZE = 100
+    
+    def __init__(self, rpc_url: str):
+        self.rpc_url = rpc_url
+        self._latest_block_cache = None
+        self._chain_id = None
+        
+        # Keep one connection open for all calls so each request does not pay
+        # for a new TCP and TLS handshake
+        url = urllib.parse.urlsplit(rpc_url)
+        self._path = (url.path or "/") + (f"?{url.query}" if url.query else "")
+        
+        # Ports are always passed explicitly: http.client would otherwise re-parse the
+        # host, which breaks on IPv6 addresses (urlsplit strips their brackets)
+        host, port = url.hostname, url.port or (443 if url.scheme == "https" else 80)
+        
+        # Honour HTTP_PROXY / HTTPS_PROXY / NO_PROXY from the environment, as urlopen did
+        connect_host, connect_port = host, port
+        proxy_headers = {}
+        proxy = urllib.request.getproxies().get(url.scheme)
+        if proxy and not urllib.request.proxy_bypass(host):
+            proxy_url = urllib.parse.urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+            connect_host = proxy_url.hostname
+            connect_port = proxy_url.port or (443 if proxy_url.scheme == "https" else 80)
+            if proxy_url.username:
+                credentials = f"{urllib.parse.unquote(proxy_url.username)}:{urllib.parse.unquote(proxy_url.password or '')}"
+                proxy_headers["Proxy-Authorization"] = "Basic " + base64.b64encode(credentials.encode()).decode()
+        else:
+            proxy = None
+        
+        if url.scheme == "https":
+            # One verifying SSL context for the client's lifetime, so certificates are
+            # loaded once and reconnects can resume the TLS session
+            self._ssl_ctx = ssl.create_default_context()
+            self._ssl_ctx.set_alpn_protocols(["http/1.1"])
+            self._connection = _ResumingHTTPSConnection(connect_host, connect_port, timeout=30, context=self._ssl_ctx)
+            if proxy:
+                # TLS to the node runs inside a CONNECT tunnel through the proxy
+                self._connection.set_tunnel(host, port, headers=proxy_headers)
+            self._proxy_headers = {}
+        else:
+            self._connection = http.client.HTTPConnection(connect_host, connect_port, timeout=30)
+            if proxy:
+                # A plain HTTP proxy is sent the absolute URL of the node
+                self._path = urllib.parse.urlunsplit(url._replace(fragment=""))
+            # Headers sent to a plain HTTP proxy with every request
+            self._proxy_headers = proxy_headers
+    
+    @staticmethod
+    def _decode_body(body: bytes, content_encoding: Optional[str]) -> bytes:
+        """Decompress a response body according to its Content-Encoding header."""
+        content_encoding = (content_encoding or "").strip().lower()
+        if content_encoding == "gzip":
+            return gzip.decompress(body)
+        if content_encoding == "deflate":
+            try:
+                return zlib.decompress(body)
+            except zlib.error:
+                # Some servers send raw deflate data without the zlib wrapper
+                return zlib.decompress(body, -zlib.MAX_WBITS)
+        return body
+    
+    def _send(self, data: bytes, headers: dict) -> http.client.HTTPResponse:
+        """Send a POST over the persistent connection and read the full response.
+        
+        The server may close an idle keep-alive connection at any time, so the
+        request is retried once on a fresh connection if that happens.
+        """
+        for attempt in range(2):
+            # Only a connection left open by an earlier request can have gone stale
+            reused = self._connection.sock is not None
+            try:
+                self._connection.request("POST", self._path, body=data, headers=headers)
+                response = self._connection.getresponse()
+                response.body = response.read()
+                return response
+            except TimeoutError:
+                self._connection.close()
+                raise
+            except (http.client.HTTPException, OSError):
+                self._connection.close()
+                if attempt or not reused:
+                    raise
+            except Exception:
+                self._connection.close()
+                raise
+    
+    def _post(self, payload):
+        """POST a JSON-RPC payload (a single call or a batch) and return the decoded response."""
+        try:
+            data = _json_dumps(payload)
+            response = self._send(data, {
+                'Content-Type': 'application/json',
+                'Accept-Encoding': 'gzip, deflate',
+                **self._proxy_headers
+            })
+            
+            # Redirects are not followed (urlopen re-sent a redirected POST as a GET without its body)
+            if response.status >= 300:
+                raise Exception(f"Network error: HTTP Error {response.status}: {response.reason}")
+            
+            body = self._decode_body(response.body, response.headers.get('Content-Encoding'))
+            return _json_loads(body)
+        except (OSError, http.client.HTTPException) as e:
+            raise Exception(f"Network error: {e}")
+        except (zlib.error, EOFError) as e:
+            # Corrupt or truncated compressed body
+            raise Exception(f"Network error: Invalid compressed response: {e}")
+        except json.JSONDecodeError as e:
+            raise Exception(f"Invalid JSON response: {e}")
+    
+    def _make_rpc_call(self, method: str, params: list) -> dict:
+        """Make a JSON-RPC call to the archival node."""
+        payload = {
+            "jsonrpc": "2.0",
+            "method": method,
+            "params": params,
+            "id": 1
+        }
+        
+        result = self._post(payload)
+        
+        if "error" in result:
+            raise RPCError(result["error"])
+        
+        return result["result"]
+    
+    def batch_call(self, requests: list) -> list:
+        """Make several JSON-RPC calls in batched HTTP requests of up to MAX_BATCH_SIZE calls.
+        
+        `requests` is a list of (method, params) tuples. Servers may answer a batch
+        in any order, so results are matched back by id and returned in request order.
+        """
+        results = []
+        for start in range(0, len(requests), self.MAX_BATCH_SIZE):
+            results.extend(self._batch_chunk(requests[start:start + self.MAX_BATCH_SIZE]))
+        return results
+    
+    def _batch_chunk(self, requests: list) -> list:
+        """Send one batched HTTP request and return its results in request order."""
+        payload = [
+            {
+                "jsonrpc": "2.0",
+                "method": method,
+                "params": params,
+                "id": request_id
+            }
+            for request_id, (method, params) in enumerate(requests)
+        ]
+        
+        responses = self._post(payload)
+        
+        if not isinstance(responses, list):
+            raise RPCError(responses.get("error", responses))
+        
+        results = {}
+        for response in responses:
+            if "error" in response:
+                raise RPCError(response["error"])
+            results[response.get("id")] = response["result"]
+        
+        # Every request must be answered exactly once, under the id it was sent with
+        if len(responses) != len(requests) or set(results) != set(range(len(requests))):
+            raise Exception(f"RPC error: batch response ids {sorted(results, key=str)} do not match "
+                            f"request ids 0-{len(requests) - 1}")
+        
+        return [results[request_id] for request_id in range(len(requests))]
+    
+    def get_cached_latest_block(self) -> Optional[Tuple[int, int]]:
+        """Get the cached latest (block_number, block_timestamp) if younger than LATEST_BLOCK_TTL."""
+        if self._latest_block_cache is not None:
+            latest_block, fetched_at = self._latest_block_cache
+            if time.monotonic() - fetched_at < self.LATEST_BLOCK_TTL:
+                return latest_block
+        return None
+    
+    def cache_latest_block(self, block: dict) -> Tuple[int, int]:
+        """Remember the latest block's number and timestamp for LATEST_BLOCK_TTL seconds."""
+        latest_block = (hex_to_int(block["number"]), hex_to_int(block["timestamp"]))
+        self._latest_block_cache = (latest_block, time.monotonic())
+        return latest_block
+    
+    def get_block_number(self) -> int:
+        """Get the latest block number."""
+        latest_block = self.get_cached_latest_block()
+        if latest_block is not None:
+            return latest_block[0]
+        result = self._make_rpc_call("eth_blockNumber", [])
+        return hex_to_int(result)
+    
+    def get_chain_id(self) -> int:
+        """Get the chain id (fetched once per client)."""
+        if self._chain_id is None:
+            self._chain_id = hex_to_int(self._make_rpc_call("eth_chainId", []))
+        return self._chain_id
+    
+    def get_block_by_number(self, block_number: int, include_transactions: bool = False) -> dict:
+        """Get block details by block number."""
+        return self._make_rpc_call("eth_getBlockByNumber", [int_to_hex(block_number), include_transactions])
+    
+    def get_balance(self, address: str, block_number: int) -> int:
+        """Get balance in wei at a specific block."""
+        result = self._make_rpc_call("eth_getBalance", [address, int_to_hex(block_number)])
+        return hex_to_int(result)
+    
+    def call_contract(self, to_address: str, data: str, block_number: int) -> str:
+        """Make a contract call at a specific block."""
+        call_params = {
+            "to": to_address,
+            "data": data
+        }
+        return self._make_rpc_call("eth_call", [call_params, int_to_hex(block_number)])
+
+
+class _BlockSearch:
+    """State of the search for the last block with timestamp <= target_timestamp.
+    
+    Invariant: block `left` is at or before the target, block `right` is after it.
+    `right_confirmed` is True only if block `right` has an actual timestamp after
+    the target; an unavailable block is also used as `right`, but then `left` may
+    not really be the last block at or before the target.
+    """
+    
+    def __init__(self, target_timestamp: int, left: int, left_timestamp: int,
+                 right: int, right_timestamp: int, from_head: bool, split: int):
+        self.target_timestamp = target_timestamp
+        self.left, self.left_timestamp = left, left_timestamp
+        self.right, self.right_timestamp = right, right_timestamp
+        self.right_confirmed = True
+        self.from_head = from_head
+        self.split = split
+        self.even_split = False
+    
+    @property
+    def done(self) -> bool:
+        return self.right - self.left <= 1
+    
+    def narrow(self, probes: List[Tuple[int, Optional[int]]]):
+        """Narrow the range using (block_number, block_timestamp) probes sorted by block number.
+        
+        Probes outside the current range are ignored; a timestamp of None means
+        the block was not available and is treated as being after the target.
+        """
+        left, right = self.left, self.right
+        new_right = (right, self.right_timestamp, self.right_confirmed)
+        for block_number, block_timestamp in probes:
+            if not left < block_number < right:
+                continue
+            if block_timestamp is not None and block_timestamp <= self.target_timestamp:
+                self.left, self.left_timestamp = block_number, block_timestamp
+                new_right = (right, self.right_timestamp, self.right_confirmed)
+            elif new_right[0] == right:
+                if block_timestamp is None:
+                    new_right = (block_number, self.right_timestamp, False)
+                else:
+                    new_right = (block_number, block_timestamp, True)
+        self.right, self.right_timestamp, self.right_confirmed = new_right
+        
+        self.from_head = False
+        self.even_split = (self.right - self.left) * self.split > right - left
+
+
+class BalanceCheckerBase:
+    """Base class for checking balances on specific dates.
+    
+    Subclasses set TOKEN_SYMBOL and implement _balance_request (and _decode_balance
+    if the call does not return a plain hex quantity).
+    """
+    
+    # Symbol of the checked token, used in messages and the result's balance key
+    TOKEN_SYMBOL = None
+    
+    # Kava EVM blocks are numbered from 1, but a pruned node (or a chain started
+    # at a later initial height) cannot serve that block. The first block the
+    # node can serve is looked up once per RPC endpoint and shared by all checkers.
+    GENESIS_BLOCK = 1
+    _first_blocks = {}
+    
+    # An even-split round divides the range into this many parts (probing one
+    # block fewer); a round that does not shrink the range by at least this
+    # factor makes the next round split evenly
+    SEARCH_SPLIT = 8
+    
+    # Multiples of the estimated distance from the chain head probed in the first round
+    HEAD_BRACKET_FACTORS = (0.5, 0.75, 0.9, 1.0, 1.1, 1.25, 1.5, 2.0)
+    
+    # Block timestamps are immutable, so probed blocks are kept in a per-process
+    # LRU cache keyed by (rpc_url, block_number) and reused by later searches
+    BLOCK_TIMESTAMP_CACHE_SIZE = 4096
+    _block_timestamps = OrderedDict()
+    
+    # Probes only need the timestamp, so they ask for the block header when the
+    # node supports it; whether it does is remembered per RPC endpoint
+    HEADER_METHOD = "eth_getHeaderByNumber"
+    _header_method_supported = {}
+    
+    def __init__(self, rpc_url: str, address: str, cache_dir: Optional[str] = DEFAULT_CACHE_DIR):
+        self.rpc_client = KavaRPCClient(rpc_url)
+        self.address = address
+        
+        # (target_timestamp, block_number, block_timestamp, successor_known) of the last search;
+        # successor_known is True only if the next block was seen to be past the target
+        self._last_search = None
+        
+        # On-disk date -> last block index; pass cache_dir=None to disable it
+        self.cache_dir = cache_dir
+        self._day_index = None
+    
+    def validate_date(self, date_str: str) -> datetime:
+        """Validate and parse the date string."""
+        match = _DATE_RE.fullmatch(date_str)
+        if match is None:
+            raise ValueError("Invalid date format. Use YYYY-MM-DD format")
+        
+        try:
+            date_obj = datetime(*map(int, match.groups()), tzinfo=timezone.utc)
+        except ValueError:
+            raise ValueError("Invalid date format. Use YYYY-MM-DD format")
+        
+        # Check if date is not in the future
+        if date_obj.date() > datetime.now(timezone.utc).date():
+            raise ValueError("Date cannot be in the future")
+        
+        return date_obj
+    
+    def date_to_timestamps(self, date_obj: datetime) -> Tuple[int, int]:
+        """Convert date to start and end timestamps of the day."""
+        start_of_day = calendar.timegm((date_obj.year, date_obj.month, date_obj.day, 0, 0, 0))
+        end_of_day = start_of_day + 86399  # 23:59:59 of the same day
+        return start_of_day, end_of_day
+    
+    def _cache_block_timestamp(self, block_number: int, block_timestamp: int):
+        """Store a block timestamp in the LRU cache, evicting the oldest entry if full."""
+        key = (self.rpc_client.rpc_url, block_number)
+        self._block_timestamps[key] = block_timestamp
+        self._block_timestamps.move_to_end(key)
+        if len(self._block_timestamps) > self.BLOCK_TIMESTAMP_CACHE_SIZE:
+            self._block_timestamps.popitem(last=False)
+    
+    def _get_block_headers(self, block_numbers: List[int]) -> List[Optional[dict]]:
+        """Get block headers in one batched request.
+        
+        Uses HEADER_METHOD, which returns a header without the block body, and
+        falls back to eth_getBlockByNumber on nodes that do not implement it.
+        """
+        if not block_numbers:
+            return []
+        
+        rpc_url = self.rpc_client.rpc_url
+        if self._header_method_supported.get(rpc_url, True):
+            try:
+                headers = self.rpc_client.batch_call([
+                    (self.HEADER_METHOD, [int_to_hex(block_number)])
+                    for block_number in block_numbers
+                ])
+                self._header_method_supported[rpc_url] = True
+                return headers
+            except RPCError as e:
+                # Only a node that does not know the method lacks it; any other
+                # error is a failure of this request and is left to the caller
+                if e.code != RPCError.METHOD_NOT_FOUND:
+                    raise
+                self._header_method_supported[rpc_url] = False
+        
+        return self.rpc_client.batch_call([
+            ("eth_getBlockByNumber", [int_to_hex(block_number), False])
+            for block_number in block_numbers
+        ])
+    
+    def _get_block_timestamps(self, block_numbers: List[int]) -> List[Optional[int]]:
+        """Get the timestamps of several blocks, fetching cache misses in one batched request."""
+        rpc_url = self.rpc_client.rpc_url
+        timestamps = {}
+        missing = []
+        for block_number in block_numbers:
+            key = (rpc_url, block_number)
+            if key in self._block_timestamps:
+                self._block_timestamps.move_to_end(key)
+                timestamps[block_number] = self._block_timestamps[key]
+            else:
+                missing.append(block_number)
+        
+        blocks = self._get_block_headers(missing)
+        for block_number, block in zip(missing, blocks):
+            if block is None:
+                timestamps[block_number] = None
+            else:
+                timestamps[block_number] = hex_to_int(block["timestamp"])
+                self._cache_block_timestamp(block_number, timestamps[block_number])
+        
+        return [timestamps[block_number] for block_number in block_numbers]
+    
+    def _get_chain_bounds(self) -> Tuple[int, int, int, int]:
+        """Get the latest block number and timestamp, and the first available block number and timestamp.
+        
+        The latest and genesis blocks are independent, so whichever of them is
+        not cached yet is fetched together in one batched request.
+        """
+        rpc_url = self.rpc_client.rpc_url
+        latest = self.rpc_client.get_cached_latest_block()
+        requests = []
+        if latest is None:
+            requests.append(("eth_getBlockByNumber", ["latest", False]))
+        if rpc_url not in self._first_blocks:
+            requests.append(("eth_getBlockByNumber", [int_to_hex(self.GENESIS_BLOCK), False]))
+        
+        blocks = self.rpc_client.batch_call(requests)
+        
+        if latest is None:
+            block = blocks.pop(0)
+            if block is None:
+                raise Exception("Latest block is not available")
+            latest = self.rpc_client.cache_latest_block(block)
+        
+        latest_block, latest_timestamp = latest
+        self._cache_block_timestamp(latest_block, latest_timestamp)
+        
+        if blocks:
+            if blocks[0] is None:
+                self._first_blocks[rpc_url] = self._find_first_block(latest_block, latest_timestamp)
+            else:
+                self._first_blocks[rpc_url] = (self.GENESIS_BLOCK, hex_to_int(blocks[0]["timestamp"]))
+        
+        return (latest_block, latest_timestamp) + self._first_blocks[rpc_url]
+    
+    def _find_first_block(self, latest_block: int, latest_timestamp: int) -> Tuple[int, int]:
+        """Find the first block the node can serve, when GENESIS_BLOCK is not available.
+        
+        Available blocks run without gaps from the first one to the latest, so
+        each round probes SEARCH_SPLIT - 1 evenly spaced blocks and keeps
+        the range between the last unavailable and the first available probe.
+        """
+        print(f"Warning: Block {self.GENESIS_BLOCK} is not available, searching for the first available block")
+        unavailable = self.GENESIS_BLOCK
+        available, available_timestamp = latest_block, latest_timestamp
+        while available - unavailable > 1:
+            span = available - unavailable
+            pivots = {unavailable + span * i // self.SEARCH_SPLIT for i in range(1, self.SEARCH_SPLIT)}
+            probes = self._probe_blocks(sorted(pivot for pivot in pivots if unavailable < pivot < available))
+            for block_number, block_timestamp in probes:
+                if block_timestamp is not None:
+                    available, available_timestamp = block_number, block_timestamp
+                    break
+                unavailable = block_number
+        return available, available_timestamp
+    
+    def _search_pivots(self, search: _BlockSearch) -> List[int]:
+        """Choose the blocks to probe in one round of the search.
+        
+        The target is estimated by interpolating the block time between the
+        search's `left` and `right` blocks. While the range still ends at the chain head, the probes
+        bracket the estimate at HEAD_BRACKET_FACTORS times its distance from the
+        head, so recent dates never probe the middle of the chain. Later rounds
+        probe the estimate and its neighbours at geometrically growing offsets,
+        or split the range evenly when the previous estimate was too far off.
+        """
+        left, right = search.left, search.right
+        span = right - left
+        estimate = left + (search.target_timestamp - search.left_timestamp) * span // (
+            search.right_timestamp - search.left_timestamp)
+        estimate = min(max(estimate, left + 1), right - 1)
+        pivots = {estimate}
+        
+        if search.from_head:
+            blocks_back = right - estimate
+            pivots.update(right - int(blocks_back * factor) for factor in self.HEAD_BRACKET_FACTORS)
+        elif search.even_split:
+            pivots.update(left + span * i // self.SEARCH_SPLIT for i in range(1, self.SEARCH_SPLIT))
+        else:
+            for offset in (1, span // 64, span // 8):
+                pivots.update((estimate - offset, estimate + offset))
+        
+        return sorted(pivot for pivot in pivots if left < pivot < right)
+    
+    def _probe_blocks(self, block_numbers: List[int]) -> List[Tuple[int, Optional[int]]]:
+        """Get (block_number, block_timestamp) probes, retrying a failed request once.
+        
+        A timestamp of None only ever means the node returned no such block; a
+        request that fails twice raises rather than passing its blocks off as unavailable.
+        """
+        try:
+            timestamps = self._get_block_timestamps(block_numbers)
+        except Exception as e:
+            print(f"Warning: Error accessing blocks {block_numbers[0]}-{block_numbers[-1]}, retrying: {e}")
+            timestamps = self._get_block_timestamps(block_numbers)
+        return list(zip(block_numbers, timestamps))
+    
+    def find_last_block_of_day(self, target_timestamp: int) -> Optional[Tuple[int, int]]:
+        """Find the last block with timestamp <= target_timestamp.
+        
+        Returns a (block_number, block_timestamp) tuple, or None if the node
+        has no block that old.
+        
+        Each round probes a batch of blocks chosen by _search_pivots in a single
+        batched request and narrows the range to the two probes around the target.
+        """
+        latest_block, latest_timestamp, first_block, first_timestamp = self._get_chain_bounds()
+        
+        if latest_timestamp <= target_timestamp:
+            self._last_search = (target_timestamp, latest_block, latest_timestamp, False)
+            return latest_block, latest_timestamp
+        
+        if first_timestamp > target_timestamp:
+            return None
+        
+        left, left_timestamp = first_block, first_timestamp
+        right, right_timestamp = latest_block, latest_timestamp
+        
+        # The previous result bounds this search: a later target cannot end before
+        # it, and an earlier one cannot end after it (if its successor was known to
+        # be past the previous target)
+        if self._last_search is not None:
+            last_target, last_block, last_timestamp, successor_known = self._last_search
+            if target_timestamp >= last_target:
+                left, left_timestamp = last_block, last_timestamp
+            if target_timestamp <= last_target and successor_known and last_block + 1 < right:
+                right, right_timestamp = last_block + 1, last_target + 1
+        
+        search = _BlockSearch(target_timestamp, left, left_timestamp, right, right_timestamp,
+                              from_head=right == latest_block, split=self.SEARCH_SPLIT)
+        while not search.done:
+            search.narrow(self._probe_blocks(self._search_pivots(search)))
+        
+        if not search.right_confirmed:
+            print(f"Warning: Block {search.right} is not available, so block {search.left} "
+                  f"may not be the last block before {target_timestamp}")
+        
+        self._last_search = (target_timestamp, search.left, search.left_timestamp, search.right_confirmed)
+        return search.left, search.left_timestamp
+    
+    def wei_to_token(self, wei_amount: int) -> Decimal:
+        """Convert wei to token units (18 decimal places), exactly."""
+        # Integer divmod keeps every digit; float division (or Decimal arithmetic
+        # at the default 28-digit precision) would round large balances
+        whole, fraction = divmod(wei_amount, WEI_PER_TOKEN)
+        return Decimal(f"{whole}.{fraction:018d}")
+    
+    def _balance_request(self, block_number: int) -> Tuple[str, list]:
+        """Get the (method, params) RPC call that fetches the balance at a block, for batching."""
+        raise NotImplementedError
+    
+    def _decode_balance(self, result: str) -> int:
+        """Decode the result of the _balance_request call into wei."""
+        return hex_to_int(result)
+    
+    def _open_day_index(self) -> Optional[sqlite3.Connection]:
+        """Open the on-disk day index, or return None if it is disabled or unusable."""
+        if self._day_index is None and self.cache_dir is not None:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                self._day_index = sqlite3.connect(os.path.join(self.cache_dir, "day_index.sqlite"))
+                self._day_index.execute(
+                    "CREATE TABLE IF NOT EXISTS day_index ("
+                    "chain_id INTEGER, day TEXT, block INTEGER, block_timestamp INTEGER, "
+                    "PRIMARY KEY (chain_id, day))"
+                )
+            except (OSError, sqlite3.Error) as e:
+                print(f"Warning: Day index disabled: {e}")
+                self.cache_dir = None
+                self._day_index = None
+        return self._day_index
+    
+    def _lookup_day(self, day: str) -> Optional[Tuple[int, int]]:
+        """Get the (block_number, block_timestamp) recorded for a day, if any."""
+        day_index = self._open_day_index()
+        if day_index is None:
+            return None
+        try:
+            row = day_index.execute(
+                "SELECT block, block_timestamp FROM day_index WHERE chain_id = ? AND day = ?",
+                (self.rpc_client.get_chain_id(), day)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Warning: Day index lookup failed: {e}")
+            return None
+        return None if row is None else (row[0], row[1])
+    
+    def _record_day(self, day: str, block_number: int, block_timestamp: int):
+        """Record the last block of a finished day in the day index."""
+        day_index = self._open_day_index()
+        if day_index is None:
+            return
+        try:
+            with day_index:
+                day_index.execute(
+                    "INSERT OR REPLACE INTO day_index VALUES (?, ?, ?, ?)",
+                    (self.rpc_client.get_chain_id(), day, block_number, block_timestamp)
+                )
+        except sqlite3.Error as e:
+            print(f"Warning: Day index update failed: {e}")
+    
+    def get_balance_on_date(self, date_str: str) -> dict:
+        """Get the token balance of the address on the specified date."""
+        # Validate date
+        date_obj = self.validate_date(date_str)
+        start_timestamp, end_timestamp = self.date_to_timestamps(date_obj)
+        
+        print(f"Finding {self.TOKEN_SYMBOL} balance for {self.address} on {date_str}")
+        print(f"Looking for last block before {end_timestamp} ({datetime.fromtimestamp(end_timestamp, tz=timezone.utc)})")
+        
+        # Find the last block of the day, skipping the search if the day is already indexed
+        last_block_of_day = self._lookup_day(date_str)
+        if last_block_of_day is None:
+            last_block_of_day = self.find_last_block_of_day(end_timestamp)
+            
+            if last_block_of_day is None:
+                raise Exception(f"No blocks found for date {date_str}")
+            
+            # The last block of a day is final once the next block is seen to be on a later day
+            successor_known = self._last_search[3]
+            if successor_known:
+                self._record_day(date_str, *last_block_of_day)
+        
+        # The search already knows the block's timestamp, so no verification fetch is needed
+        last_block, block_timestamp = last_block_of_day
+        
+        # Get balance at that block
+        balance_wei = self._decode_balance(self.rpc_client._make_rpc_call(*self._balance_request(last_block)))
+        
+        return self._balance_result(date_str, last_block, block_timestamp, balance_wei)
+    
+    def _balance_result(self, date_str: str, block_number: int, block_timestamp: int, balance_wei: int) -> dict:
+        """Build the result dict returned for one date."""
+        block_datetime = datetime.fromtimestamp(block_timestamp, tz=timezone.utc)
+        return {
+            "date": date_str,
+            "address": self.address,
+            "block_number": block_number,
+            "block_timestamp": block_timestamp,
+            "block_datetime": block_datetime.strftime("%Y-%m-%d %H:%M:%S UTC"),
+            "balance_wei": balance_wei,
+            f"balance_{self.TOKEN_SYMBOL.lower()}": self.wei_to_token(balance_wei)
+        }
+    
+    def get_balances_on_dates(self, dates: List[str]) -> List[dict]:
+        """Get the balance of the address on each of the specified dates.
+        
+        The searches for all dates run side by side: each round sends the probes
+        of every unresolved date in one batched request (and every date narrows
+        its range with all of them), then the balances at all the found blocks
+        are fetched in one final batch. Results are returned in input order.
+        """
+        end_timestamps = {}
+        for date_str in dates:
+            start_timestamp, end_timestamps[date_str] = self.date_to_timestamps(self.validate_date(date_str))
+        
+        print(f"Finding {self.TOKEN_SYMBOL} balances for {self.address} on {len(end_timestamps)} dates")
+        
+        last_blocks = {}
+        for date_str in end_timestamps:
+            last_block_of_day = self._lookup_day(date_str)
+            if last_block_of_day is not None:
+                last_blocks[date_str] = last_block_of_day
+        
+        searches = {}
+        if len(last_blocks) < len(end_timestamps):
+            latest_block, latest_timestamp, first_block, first_timestamp = self._get_chain_bounds()
+            for date_str, end_timestamp in end_timestamps.items():
+                if date_str in last_blocks:
+                    continue
+                if latest_timestamp <= end_timestamp:
+                    last_blocks[date_str] = (latest_block, latest_timestamp)
+                elif first_timestamp > end_timestamp:
+                    raise Exception(f"No blocks found for date {date_str}")
+                else:
+                    searches[date_str] = _BlockSearch(end_timestamp, first_block, first_timestamp,
+                                                      latest_block, latest_timestamp, from_head=True,
+                                                      split=self.SEARCH_SPLIT)
+        
+        active = list(searches.values())
+        while active:
+            pivots = sorted({pivot for search in active for pivot in self._search_pivots(search)})
+            probes = self._probe_blocks(pivots)
+            for search in active:
+                search.narrow(probes)
+            active = [search for search in active if not search.done]
+        
+        # A searched day's last block is final only if the next block was seen to be on a later day
+        for date_str, search in searches.items():
+            last_blocks[date_str] = (search.left, search.left_timestamp)
+            if search.right_confirmed:
+                self._record_day(date_str, search.left, search.left_timestamp)
+            else:
+                print(f"Warning: Block {search.right} is not available, so block {search.left} "
+                      f"may not be the last block of {date_str}")
+        
+        # Fetch the balances at all the last blocks in one request
+        block_numbers = sorted({block_number for block_number, block_timestamp in last_blocks.values()})
+        results = self.rpc_client.batch_call([self._balance_request(block_number) for block_number in block_numbers])
+        balances = {
+            block_number: self._decode_balance(result)
+            for block_number, result in zip(block_numbers, results)
+        }
+        
+        return [
+            self._balance_result(date_str, *last_blocks[date_str], balances[last_blocks[date_str][0]])
+            for date_str in dates
+        ]
\ No newline at end of file
@@ -0,0 +1,485 @@
+"""
+Tests for kava_core against a fake JSON-RPC node served over local HTTP.
+"""
+
+import bisect
+import calendar
+import gzip
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import unittest
+import zlib
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
+
+from kava_balance_checker import KavaBalanceChecker
+from kava_core import BalanceCheckerBase, KavaRPCClient, _BlockSearch
+from wkava_balance_checker import WKAVABalanceChecker
+
+ADDRESS = "0x7D5CEA2e5fBDFecca8CcfbFe85AC021C817a7f38"
+
+
+class FakeChain:
+    """A chain of blocks 1..latest_block with irregular block times."""
+    
+    def __init__(self, latest_block: int = 2_000_000, seed: int = 1):
+        self.latest_block = latest_block
+        rng = random.Random(seed)
+        
+        # Block times of 1-40s, switching between slow and fast stretches
+        self.timestamps = [None, 1_600_000_000]
+        block_time = 6
+        for block_number in range(2, latest_block + 1):
+            if block_number % 50_000 == 0:
+                block_time = rng.choice((2, 6, 12, 40))
+            self.timestamps.append(self.timestamps[-1] + rng.randint(1, block_time))
+        
+        # Blocks the node answers with a null result
+        self.unavailable = set()
+    
+    def last_block_before(self, target_timestamp: int):
+        """Bisect oracle: the last block with timestamp <= target_timestamp, or None."""
+        block_number = bisect.bisect_right(self.timestamps, target_timestamp, lo=1) - 1
+        return block_number or None
+    
+    def balance(self, block_number: int) -> int:
+        return block_number * 10 ** 12 + 123456789
+
+
+class FakeNode:
+    """Serve a FakeChain over JSON-RPC on a local port, answering batches in reverse order."""
+    
+    def __init__(self, chain: FakeChain):
+        self.chain = chain
+        self.posts = 0
+        self.fail_posts = 0
+        self.drop_last_response = False
+        self.first_block = 1
+        self.header_method = False
+        self.close_connections = False
+        self.methods = []
+        self.requests = []
+        self.batch_sizes = []
+        
+        node = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+            
+            def log_message(self, *args):
+                pass
+            
+            def do_POST(self):
+                node.requests.append((self.path, self.headers))
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                status, body = node.handle_post(payload)
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                # Drop the connection without announcing it, like a node closing an idle keep-alive
+                self.close_connection = node.close_connections
+        
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def handle_post(self, payload):
+        self.posts += 1
+        if self.fail_posts:
+            self.fail_posts -= 1
+            return 500, {}
+        if not isinstance(payload, list):
+            return 200, self.handle_call(payload)
+        self.batch_sizes.append(len(payload))
+        responses = [self.handle_call(request) for request in payload]
+        responses.reverse()
+        if self.drop_last_response:
+            responses.pop()
+        return 200, responses
+    
+    def handle_call(self, request):
+        method, params = request["method"], request["params"]
+        self.methods.append(method)
+        
+        def result(value):
+            return {"jsonrpc": "2.0", "id": request["id"], "result": value}
+        
+        def block_number(tag):
+            return self.chain.latest_block if tag == "latest" else int(tag, 16)
+        
+        if method == "eth_chainId":
+            return result("0x8ae")
+        if method == "eth_blockNumber":
+            return result(hex(self.chain.latest_block))
+        if method == "eth_getBlockByNumber" or (method == "eth_getHeaderByNumber" and self.header_method):
+            number = block_number(params[0])
+            if not self.first_block <= number <= self.chain.latest_block or number in self.chain.unavailable:
+                return result(None)
+            return result({"number": hex(number), "timestamp": hex(self.chain.timestamps[number])})
+        if method == "eth_getBalance":
+            return result(hex(self.chain.balance(block_number(params[1]))))
+        if method == "eth_call":
+            return result("0x" + format(self.chain.balance(block_number(params[1])), "064x"))
+        return {"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32601, "message": "method not found"}}
+
+
+def end_of_day(date_str: str) -> int:
+    year, month, day = map(int, date_str.split("-"))
+    return calendar.timegm((year, month, day, 23, 59, 59))
+
+
+class FakeNodeTestCase(unittest.TestCase):
+    
+    chain = None
+    
+    @classmethod
+    def setUpClass(cls):
+        # Building the chain takes a moment, so all tests share one
+        if FakeNodeTestCase.chain is None:
+            FakeNodeTestCase.chain = FakeChain()
+    
+    def setUp(self):
+        self.chain.unavailable = set()
+        
+        # A new node may get a port used by an earlier test, so start from empty per-endpoint caches
+        BalanceCheckerBase._block_timestamps.clear()
+        BalanceCheckerBase._first_blocks.clear()
+        BalanceCheckerBase._header_method_supported.clear()
+        self.node = FakeNode(self.chain)
+        self.addCleanup(self.node.close)
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+    
+    def client(self) -> KavaRPCClient:
+        client = KavaRPCClient(self.node.url)
+        self.addCleanup(client._connection.close)
+        return client
+    
+    def checker(self, checker_class=KavaBalanceChecker, cache_dir: bool = True):
+        checker = checker_class(self.node.url, ADDRESS, cache_dir=self.cache_dir if cache_dir else None)
+        self.addCleanup(checker.rpc_client._connection.close)
+        self.addCleanup(lambda: checker._day_index and checker._day_index.close())
+        return checker
+
+
+class ValidateDateTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.checker = KavaBalanceChecker("http://127.0.0.1:8545", ADDRESS, cache_dir=None)
+    
+    def test_valid_date(self):
+        self.assertEqual(self.checker.validate_date("2024-02-29"), datetime(2024, 2, 29, tzinfo=timezone.utc))
+    
+    def test_invalid_dates(self):
+        for date_str in ("2024-01-01\n", "2024-2-3", "2024-02-30", "2023-02-29", "24-01-01", " 2024-01-01", "2024/01/01"):
+            with self.assertRaisesRegex(ValueError, "Invalid date format", msg=repr(date_str)):
+                self.checker.validate_date(date_str)
+    
+    def test_future_date(self):
+        tomorrow = (datetime.now(timezone.utc) + timedelta(days=1)).strftime("%Y-%m-%d")
+        with self.assertRaisesRegex(ValueError, "future"):
+            self.checker.validate_date(tomorrow)
+
+
+class WeiToTokenTest(unittest.TestCase):
+    
+    def test_exact_conversion(self):
+        kava = KavaBalanceChecker("http://127.0.0.1:8545", ADDRESS, cache_dir=None)
+        wkava = WKAVABalanceChecker("http://127.0.0.1:8545", ADDRESS, cache_dir=None)
+        for wei_amount, expected in ((10 ** 40 + 1, "10000000000000000000000.000000000000000001"),
+                                     (5 * 10 ** 18, "5.000000000000000000"),
+                                     (1, "0.000000000000000001"),
+                                     (0, "0.000000000000000000")):
+            for converted in (kava.wei_to_kava(wei_amount), wkava.wei_to_wkava(wei_amount)):
+                self.assertIsInstance(converted, Decimal)
+                self.assertEqual(format(converted, "f"), expected)
+                self.assertEqual(converted, Decimal(expected))
+    
+    def test_report_formatting(self):
+        checker = KavaBalanceChecker("http://127.0.0.1:8545", ADDRESS, cache_dir=None)
+        self.assertEqual(f"{checker.wei_to_kava(10 ** 40 + 1):.6f}", "10000000000000000000000.000000")
+        self.assertEqual(f"{checker.wei_to_kava(5 * 10 ** 18):.6f}", "5.000000")
+        self.assertEqual(f"{checker.wei_to_kava(1_234_567_890_123_456_789):.6f}", "1.234568")
+
+
+class FindLastBlockOfDayTest(FakeNodeTestCase):
+    
+    def test_matches_bisect_oracle(self):
+        checker = self.checker()
+        first, last = self.chain.timestamps[1], self.chain.timestamps[-1]
+        rng = random.Random(2)
+        targets = [first - 1, first, first + 1, last - 1, last, last + 100]
+        targets += [rng.randint(first, last) for _ in range(100)]
+        for target_timestamp in targets:
+            expected = self.chain.last_block_before(target_timestamp)
+            result = checker.find_last_block_of_day(target_timestamp)
+            if expected is None:
+                self.assertIsNone(result)
+            else:
+                self.assertEqual(result, (expected, self.chain.timestamps[expected]), target_timestamp)
+    
+    def test_search_split_override(self):
+        class BisectingChecker(KavaBalanceChecker):
+            SEARCH_SPLIT = 2
+        
+        checker = self.checker(BisectingChecker)
+        rng = random.Random(4)
+        for target_timestamp in [rng.randint(self.chain.timestamps[1], self.chain.timestamps[-1]) for _ in range(20)]:
+            self.assertEqual(checker.find_last_block_of_day(target_timestamp)[0], self.chain.last_block_before(target_timestamp))
+        
+        # A round that cuts the range to 40% is enough for a split of 2, not of 8
+        for split, even_split in ((2, False), (8, True)):
+            search = _BlockSearch(100, 0, 0, 1000, 1000, from_head=False, split=split)
+            search.narrow([(400, 400)])
+            self.assertEqual((search.right, search.even_split), (400, even_split))
+    
+    def test_pruned_node_starts_at_first_available_block(self):
+        self.node.first_block = 765_432
+        checker = self.checker()
+        first_timestamp = self.chain.timestamps[self.node.first_block]
+        self.assertIsNone(checker.find_last_block_of_day(first_timestamp - 1))
+        self.assertEqual(checker.find_last_block_of_day(first_timestamp), (765_432, first_timestamp))
+        
+        rng = random.Random(3)
+        for target_timestamp in [rng.randint(first_timestamp, self.chain.timestamps[-1]) for _ in range(20)]:
+            expected = self.chain.last_block_before(target_timestamp)
+            self.assertEqual(checker.find_last_block_of_day(target_timestamp)[0], expected)
+    
+    def test_unavailable_block_is_not_confirmed(self):
+        checker = self.checker()
+        target_timestamp = self.chain.timestamps[1_000_000]
+        expected = self.chain.last_block_before(target_timestamp)
+        self.chain.unavailable = set(range(expected - 1000, expected + 1000))
+        
+        block_number, block_timestamp = checker.find_last_block_of_day(target_timestamp)
+        self.assertLessEqual(block_timestamp, target_timestamp)
+        self.assertFalse(checker._last_search[3])
+
+
+class BalancesOnDatesTest(FakeNodeTestCase):
+    
+    DATES = ["2020-09-13", "2020-10-01", "2020-12-31", "2021-02-28", "2021-02-28", "2021-03-01", "2020-11-05"]
+    
+    def test_matches_get_balance_on_date(self):
+        for checker_class in (KavaBalanceChecker, WKAVABalanceChecker):
+            expected = [
+                self.checker(checker_class, cache_dir=False).get_balance_on_date(date_str)
+                for date_str in self.DATES
+            ]
+            results = self.checker(checker_class).get_balances_on_dates(self.DATES)
+            self.assertEqual(results, expected)
+            for date_str, result in zip(self.DATES, results):
+                block_number = self.chain.last_block_before(end_of_day(date_str))
+                self.assertEqual(result["block_number"], block_number)
+                self.assertEqual(result["balance_wei"], self.chain.balance(block_number))
+    
+    def test_indexed_days_skip_the_search(self):
+        checker = self.checker()
+        expected = checker.get_balances_on_dates(self.DATES)
+        
+        self.node.posts = 0
+        self.assertEqual(self.checker().get_balances_on_dates(self.DATES), expected)
+        self.assertEqual(self.node.posts, 2)  # eth_chainId, then the balances
+
+
+class DayIndexTest(FakeNodeTestCase):
+    
+    DATE = "2021-01-10"
+    
+    def make_last_block_unavailable(self):
+        block_number = self.chain.last_block_before(end_of_day(self.DATE))
+        self.chain.unavailable = set(range(block_number + 1, block_number + 5000))
+    
+    def test_confirmed_day_is_recorded(self):
+        result = self.checker().get_balance_on_date(self.DATE)
+        self.assertEqual(self.checker()._lookup_day(self.DATE), (result["block_number"], result["block_timestamp"]))
+    
+    def test_unavailable_successor_is_not_recorded(self):
+        self.make_last_block_unavailable()
+        self.checker().get_balance_on_date(self.DATE)
+        self.assertIsNone(self.checker()._lookup_day(self.DATE))
+    
+    def test_unavailable_successor_is_not_recorded_in_batch(self):
+        self.make_last_block_unavailable()
+        self.checker().get_balances_on_dates([self.DATE])
+        self.assertIsNone(self.checker()._lookup_day(self.DATE))
+    
+    def test_failed_probe_is_not_recorded(self):
+        checker = self.checker()
+        checker.rpc_client.get_chain_id()
+        checker._get_chain_bounds()
+        self.node.fail_posts = 10
+        with self.assertRaises(Exception):
+            checker.get_balance_on_date(self.DATE)
+        self.node.fail_posts = 0
+        self.assertIsNone(self.checker()._lookup_day(self.DATE))
+    
+    def test_failed_probe_is_retried(self):
+        checker = self.checker()
+        checker.rpc_client.get_chain_id()
+        checker._get_chain_bounds()
+        self.node.fail_posts = 1
+        result = checker.get_balance_on_date(self.DATE)
+        self.assertEqual(result["block_number"], self.chain.last_block_before(end_of_day(self.DATE)))
+
+
+class HeaderMethodTest(FakeNodeTestCase):
+    
+    def test_header_method_is_used_when_supported(self):
+        self.node.header_method = True
+        checker = self.checker()
+        self.assertEqual(checker._get_block_timestamps([5, 6]), self.chain.timestamps[5:7])
+        self.assertEqual(self.node.methods, ["eth_getHeaderByNumber"] * 2)
+    
+    def test_method_not_found_falls_back(self):
+        checker = self.checker()
+        self.assertEqual(checker._get_block_timestamps([5, 6]), self.chain.timestamps[5:7])
+        self.assertFalse(checker._header_method_supported[self.node.url])
+        
+        self.node.methods = []
+        checker._get_block_timestamps([7])
+        self.assertEqual(self.node.methods, ["eth_getBlockByNumber"])
+    
+    def test_failed_request_keeps_detecting(self):
+        self.node.header_method = True
+        checker = self.checker()
+        self.node.fail_posts = 1
+        with self.assertRaises(Exception):
+            checker._get_block_headers([5])
+        self.assertNotIn(self.node.url, checker._header_method_supported)
+    
+    def test_empty_request_skips_detection(self):
+        checker = self.checker()
+        self.assertEqual(checker._get_block_headers([]), [])
+        self.assertNotIn(self.node.url, checker._header_method_supported)
+        self.assertEqual(self.node.posts, 0)
+
+
+class TransportTest(FakeNodeTestCase):
+    
+    def proxy_environment(self, **proxies):
+        environment = {name: value for name, value in os.environ.items() if "proxy" not in name.lower()}
+        return mock.patch.dict(os.environ, {**environment, **proxies}, clear=True)
+    
+    def test_closed_keep_alive_connection_is_retried(self):
+        client = self.client()
+        self.node.close_connections = True
+        self.assertEqual(client.get_chain_id(), 0x8ae)
+        client._chain_id = None
+        self.assertEqual(client.get_chain_id(), 0x8ae)
+        self.assertEqual(self.node.posts, 2)
+    
+    def test_http_proxy(self):
+        with self.proxy_environment(http_proxy=f"http://user:secret@{self.node.url[len('http://'):]}"):
+            client = KavaRPCClient("http://kava-node.invalid:8545/rpc")
+            self.addCleanup(client._connection.close)
+            self.assertEqual(client.get_chain_id(), 0x8ae)
+        path, headers = self.node.requests[0]
+        self.assertEqual(path, "http://kava-node.invalid:8545/rpc")
+        self.assertEqual(headers["Host"], "kava-node.invalid:8545")
+        self.assertEqual(headers["Proxy-Authorization"], "Basic dXNlcjpzZWNyZXQ=")
+    
+    def test_default_ports_and_ipv6_hosts(self):
+        with self.proxy_environment():
+            for rpc_url, host, port in (("http://[::1]/", "::1", 80), ("https://[::1]/rpc", "::1", 443),
+                                        ("http://[::1]:8545", "::1", 8545), ("https://evm.data.kava.io", "evm.data.kava.io", 443)):
+                connection = KavaRPCClient(rpc_url)._connection
+                self.assertEqual((connection.host, connection.port), (host, port), rpc_url)
+    
+    def test_proxy_default_port(self):
+        with self.proxy_environment(https_proxy="http://proxy.invalid"):
+            connection = KavaRPCClient("https://[::1]/")._connection
+        self.assertEqual((connection.host, connection.port), ("proxy.invalid", 80))
+        self.assertEqual((connection._tunnel_host, connection._tunnel_port), ("::1", 443))
+    
+    def test_no_proxy(self):
+        with self.proxy_environment(http_proxy="http://proxy.invalid:3128", no_proxy="127.0.0.1"):
+            client = self.client()
+            self.assertEqual(client.get_chain_id(), 0x8ae)
+        self.assertEqual(self.node.requests[0][0], "/")
+
+
+class DecodeBodyTest(unittest.TestCase):
+    
+    BODY = b'{"jsonrpc": "2.0", "id": 1, "result": "0x8ae"}'
+    
+    def setUp(self):
+        self.client = KavaRPCClient("http://127.0.0.1:8545")
+    
+    def raw_deflate(self, body: bytes) -> bytes:
+        compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        return compressor.compress(body) + compressor.flush()
+    
+    def test_encodings(self):
+        for encoding, body in ((None, self.BODY), ("identity", self.BODY), ("gzip", gzip.compress(self.BODY)),
+                               (" GZIP ", gzip.compress(self.BODY)), ("deflate", zlib.compress(self.BODY)),
+                               ("deflate", self.raw_deflate(self.BODY))):
+            self.assertEqual(KavaRPCClient._decode_body(body, encoding), self.BODY, encoding)
+    
+    def post_with_body(self, body: bytes, encoding: str):
+        response = SimpleNamespace(status=200, reason="OK", body=body, headers={"Content-Encoding": encoding})
+        with mock.patch.object(self.client, "_send", return_value=response):
+            return self.client._post({})
+    
+    def test_compressed_response(self):
+        self.assertEqual(self.post_with_body(gzip.compress(self.BODY), "gzip")["result"], "0x8ae")
+    
+    def test_corrupt_bodies_raise_network_error(self):
+        for body, encoding in ((gzip.compress(self.BODY)[:-12], "gzip"), (b"\x1f\x8bnot gzip", "gzip"),
+                               (zlib.compress(self.BODY)[:-6], "deflate"), (b"not deflate", "deflate")):
+            with self.assertRaisesRegex(Exception, "^Network error", msg=(body, encoding)):
+                self.post_with_body(body, encoding)
+    
+    def test_invalid_json(self):
+        with self.assertRaisesRegex(Exception, "^Invalid JSON response"):
+            self.post_with_body(gzip.compress(b"<html>"), "gzip")
+
+
+class BatchCallTest(FakeNodeTestCase):
+    
+    def test_results_are_returned_in_request_order(self):
+        client = self.client()
+        block_numbers = [5, 1, 300, 42, 7]
+        blocks = client.batch_call([("eth_getBlockByNumber", [hex(number), False]) for number in block_numbers])
+        self.assertEqual([int(block["number"], 16) for block in blocks], block_numbers)
+    
+    def test_large_batch_is_split(self):
+        client = self.client()
+        client.MAX_BATCH_SIZE = 10
+        block_numbers = list(range(25, 0, -1))
+        blocks = client.batch_call([("eth_getBlockByNumber", [hex(number), False]) for number in block_numbers])
+        self.assertEqual([int(block["number"], 16) for block in blocks], block_numbers)
+        self.assertEqual(self.node.batch_sizes, [10, 10, 5])
+    
+    def test_multi_date_batches_stay_within_limit(self):
+        dates = [f"2020-{month:02d}-{day:02d}" for month in (10, 11, 12) for day in range(1, 29)]
+        checker = self.checker(cache_dir=False)
+        results = checker.get_balances_on_dates(dates)
+        self.assertEqual([result["block_number"] for result in results],
+                         [self.chain.last_block_before(end_of_day(date_str)) for date_str in dates])
+        self.assertLessEqual(max(self.node.batch_sizes), KavaRPCClient.MAX_BATCH_SIZE)
+    
+    def test_missing_response_raises(self):
+        client = self.client()
+        self.node.drop_last_response = True
+        with self.assertRaisesRegex(Exception, "RPC error"):
+            client.batch_call([("eth_getBlockByNumber", [hex(number), False]) for number in (1, 2, 3)])
+
+
+if __name__ == "__main__":
+    unittest.main()
\ No newline at end of file
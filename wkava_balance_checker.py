@@ -5,84 +5,25 @@ Fetches the balance of a given 0x address for WKAVA token on any specific day fr
 """
 
 import sys
-import json
-import urllib.request
-import urllib.parse
-import urllib.error
-import ssl
-from datetime import datetime, timezone
+from decimal import Decimal
 from typing import Optional, Tuple
 
-
-class KavaRPCClient:
-    """RPC client for interacting with Kava blockchain archival node."""
-    
-    def __init__(self, rpc_url: str):
-        self.rpc_url = rpc_url
-    
-    def _make_rpc_call(self, method: str, params: list) -> dict:
-        """Make a JSON-RPC call to the archival node."""
-        payload = {
-            "jsonrpc": "2.0",
-            "method": method,
-            "params": params,
-            "id": 1
-        }
-        
-        try:
-            data = json.dumps(payload).encode('utf-8')
-            req = urllib.request.Request(
-                self.rpc_url,
-                data=data,
-                headers={'Content-Type': 'application/json'}
-            )
-            
-            # Use SSL context that works with self-signed/chain issues but still encrypts
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            
-            with urllib.request.urlopen(req, timeout=30, context=ssl_context) as response:
-                result = json.loads(response.read().decode('utf-8'))
-            
-            if "error" in result:
-                raise Exception(f"RPC error: {result['error']}")
-            
-            return result["result"]
-        except urllib.error.URLError as e:
-            raise Exception(f"Network error: {e}")
-        except json.JSONDecodeError as e:
-            raise Exception(f"Invalid JSON response: {e}")
-    
-    def get_block_number(self) -> int:
-        """Get the latest block number."""
-        result = self._make_rpc_call("eth_blockNumber", [])
-        return int(result, 16)
-    
-    def get_block_by_number(self, block_number: int, include_transactions: bool = False) -> dict:
-        """Get block details by block number."""
-        block_hex = hex(block_number)
-        return self._make_rpc_call("eth_getBlockByNumber", [block_hex, include_transactions])
-    
-    def call_contract(self, to_address: str, data: str, block_number: int) -> str:
-        """Make a contract call at a specific block."""
-        block_hex = hex(block_number)
-        call_params = {
-            "to": to_address,
-            "data": data
-        }
-        return self._make_rpc_call("eth_call", [call_params, block_hex])
+from kava_core import DEFAULT_CACHE_DIR, BalanceCheckerBase, KavaRPCClient, hex_to_int, int_to_hex  # noqa: F401 (re-exported)
 
 
-class WKAVABalanceChecker:
+class WKAVABalanceChecker(BalanceCheckerBase):
     """Main class for checking WKAVA token balances on specific dates."""
     
+    TOKEN_SYMBOL = "WKAVA"
+    
     # WKAVA contract address on Kava
     WKAVA_CONTRACT = "0xc86c7C0eFbd6A49B35E8714C5f59D99De09A225b"
     
-    def __init__(self, rpc_url: str, address: str):
-        self.rpc_client = KavaRPCClient(rpc_url)
-        self.address = address
+    def __init__(self, rpc_url: str, address: str, cache_dir: Optional[str] = DEFAULT_CACHE_DIR):
+        super().__init__(rpc_url, address, cache_dir)
+        
+        # The checked address never changes, so its balanceOf calldata is encoded once
+        self._balance_of_calldata = self.encode_balance_of_call(address)
     
     def encode_balance_of_call(self, address: str) -> str:
         """Encode balanceOf(address) function call."""
@@ -96,107 +37,32 @@ class WKAVABalanceChecker:
     
     def decode_balance_result(self, result: str) -> int:
         """Decode the balance result from contract call."""
-        if result == "0x":
-            return 0
-        return int(result, 16)
+        return hex_to_int(result)
     
-    def validate_date(self, date_str: str) -> datetime:
-        """Validate and parse the date string."""
-        try:
-            date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-            date_obj = date_obj.replace(tzinfo=timezone.utc)
-            
-            # Check if date is not in the future
-            if date_obj.date() > datetime.now(timezone.utc).date():
-                raise ValueError("Date cannot be in the future")
-            
-            return date_obj
-        except ValueError as e:
-            if "time data" in str(e):
-                raise ValueError("Invalid date format. Use YYYY-MM-DD format")
-            raise e
-    
-    def date_to_timestamps(self, date_obj: datetime) -> Tuple[int, int]:
-        """Convert date to start and end timestamps of the day."""
-        start_of_day = int(date_obj.timestamp())
-        end_of_day = start_of_day + 86399  # 23:59:59 of the same day
-        return start_of_day, end_of_day
-    
-    def find_last_block_of_day(self, target_timestamp: int) -> Optional[int]:
-        """Find the last block with timestamp <= target_timestamp using binary search."""
-        latest_block = self.rpc_client.get_block_number()
-        
-        # Binary search for the last block with timestamp <= target_timestamp
-        left, right = 0, latest_block
-        result_block = None
-        
-        while left <= right:
-            mid = (left + right) // 2
-            
-            try:
-                block = self.rpc_client.get_block_by_number(mid)
-                if block is None:
-                    right = mid - 1
-                    continue
-                
-                block_timestamp = int(block["timestamp"], 16)
-                
-                if block_timestamp <= target_timestamp:
-                    result_block = mid
-                    left = mid + 1
-                else:
-                    right = mid - 1
-                    
-            except Exception as e:
-                print(f"Warning: Error accessing block {mid}: {e}")
-                right = mid - 1
-                continue
-        
-        return result_block
-    
-    def wei_to_wkava(self, wei_amount: int) -> float:
+    def wei_to_wkava(self, wei_amount: int) -> Decimal:
         """Convert wei to WKAVA (18 decimal places)."""
-        return wei_amount / (10 ** 18)
+        return self.wei_to_token(wei_amount)
     
     def get_wkava_balance(self, address: str, block_number: int) -> int:
         """Get WKAVA balance at a specific block."""
-        call_data = self.encode_balance_of_call(address)
+        if address == self.address:
+            call_data = self._balance_of_calldata
+        else:
+            call_data = self.encode_balance_of_call(address)
         result = self.rpc_client.call_contract(self.WKAVA_CONTRACT, call_data, block_number)
         return self.decode_balance_result(result)
     
-    def get_balance_on_date(self, date_str: str) -> dict:
-        """Get the WKAVA balance of the address on the specified date."""
-        # Validate date
-        date_obj = self.validate_date(date_str)
-        start_timestamp, end_timestamp = self.date_to_timestamps(date_obj)
-        
-        print(f"Finding WKAVA balance for {self.address} on {date_str}")
-        print(f"Looking for last block before {end_timestamp} ({datetime.fromtimestamp(end_timestamp, tz=timezone.utc)})")
-        
-        # Find the last block of the day
-        last_block = self.find_last_block_of_day(end_timestamp)
-        
-        if last_block is None:
-            raise Exception(f"No blocks found for date {date_str}")
-        
-        # Get block details for verification
-        block_details = self.rpc_client.get_block_by_number(last_block)
-        block_timestamp = int(block_details["timestamp"], 16)
-        block_datetime = datetime.fromtimestamp(block_timestamp, tz=timezone.utc)
-        
-        # Get WKAVA balance at that block
-        balance_wei = self.get_wkava_balance(self.address, last_block)
-        balance_wkava = self.wei_to_wkava(balance_wei)
-        
-        return {
-            "date": date_str,
-            "address": self.address,
-            "block_number": last_block,
-            "block_timestamp": block_timestamp,
-            "block_datetime": block_datetime.strftime("%Y-%m-%d %H:%M:%S UTC"),
-            "balance_wei": balance_wei,
-            "balance_wkava": balance_wkava
+    def _balance_request(self, block_number: int) -> Tuple[str, list]:
+        """Get the balanceOf eth_call for the address at a specific block."""
+        call_params = {
+            "to": self.WKAVA_CONTRACT,
+            "data": self._balance_of_calldata
         }
+        return "eth_call", [call_params, int_to_hex(block_number)]
+    
+    def _decode_balance(self, result: str) -> int:
+        """Decode the balanceOf result into wei."""
+        return self.decode_balance_result(result)
 
 
 def main():
@@ -225,7 +91,7 @@ def main():
         print(f"Balance: {result['balance_wkava']:.6f} WKAVA")
         print(f"Balance (wei): {result['balance_wei']:,}")
         print("="*60)
-        
+    
     except Exception as e:
         print(f"Error: {e}")
         sys.exit(1)